@@ -3,12 +3,21 @@ import os
 from datetime import datetime
 
 import boto3
+import botocore.config
 from boto3.dynamodb.types import TypeSerializer
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationSummaryBufferMemory
 from langchain.memory.chat_message_histories import DynamoDBChatMessageHistory
+from langchain.schema import AIMessage, HumanMessage
 
 now = datetime.utcnow()
-dynamodb = boto3.client("dynamodb")
+boto3_config = botocore.config.Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={"mode": "standard", "max_attempts": 3},
+    connect_timeout=1,
+    read_timeout=30,
+)
+dynamodb = boto3.client("dynamodb", config=boto3_config)
 ts = TypeSerializer()
 
 # Create reference to DynamoDB tables
@@ -18,8 +27,10 @@ conversation_table_name = os.environ.get("CONVERSATION_TABLE")
 
 class Chat:
 
-    def __init__(self, event, session_id):
+    def __init__(self, event, session_id, llm):
         print(f"Initializing FSI Agent chat with session ID: {session_id}")
+        self.llm = llm
+        self.pending_messages = []
         self.set_user_id(event)
         self.set_session_id(session_id)
         self.set_chat_index()
@@ -32,17 +43,18 @@ class Chat:
             self.set_session_id(session_id)
         conversation_id = self.session_id
 
-        # Set up conversation history
+        # Set up conversation history; messages are buffered so both turn
+        # roles persist in a single DynamoDB write via flush_messages
         self.message_history = DynamoDBChatMessageHistory(
             table_name=conversation_table_name, session_id=conversation_id
         )
-        if "Human" in event:
-            self.message_history.add_user_message(event["Human"])
-        elif "Assistant" in event:
-            self.message_history.add_ai_message(event["Assistant"])
+        self.queue_message(event)
 
-        # Set up conversation memory
-        self.memory = ConversationBufferMemory(
+        # Set up conversation memory; summarization only runs once the buffer
+        # exceeds the token limit, not on every turn
+        self.memory = ConversationSummaryBufferMemory(
+            llm=self.llm,
+            max_token_limit=1000,
             ai_prefix="Assistant",
             memory_key="chat_history",
             chat_memory=self.message_history,
@@ -51,6 +63,58 @@ class Chat:
             return_messages=True,
         )
 
+    def queue_message(self, event):
+        """
+        Buffers a message for the next flush instead of writing it immediately.
+        """
+        if "Human" in event:
+            self.pending_messages.append(HumanMessage(content=event["Human"]))
+        elif "Assistant" in event:
+            self.pending_messages.append(AIMessage(content=event["Assistant"]))
+
+    def flush_messages(self):
+        """
+        Persists all buffered messages to the conversation table in a single
+        DynamoDB round trip.
+        """
+        if not self.pending_messages:
+            return
+
+        pending = self.pending_messages
+        self.pending_messages = []
+
+        # Build the typed AttributeValues directly rather than going through
+        # TypeSerializer; the buffered messages are plain strings, so the shape
+        # matches what messages_to_dict would produce for them
+        message_values = {
+            "L": [
+                {
+                    "M": {
+                        "type": {"S": message.type},
+                        "data": {
+                            "M": {
+                                "type": {"S": message.type},
+                                "content": {"S": message.content},
+                                "additional_kwargs": {"M": {}},
+                                "example": {"BOOL": False},
+                            }
+                        },
+                    }
+                }
+                for message in pending
+            ]
+        }
+        dynamodb.update_item(
+            TableName=conversation_table_name,
+            Key={"SessionId": {"S": self.session_id}},
+            UpdateExpression="SET #h = list_append(if_not_exists(#h, :empty), :m)",
+            ExpressionAttributeNames={"#h": "History"},
+            ExpressionAttributeValues={
+                ":m": message_values,
+                ":empty": {"L": []},
+            },
+        )
+
     def get_chat_index(self):
         key = {"id": self.user_id}
         chat_index = dynamodb.get_item(
@@ -45,6 +45,13 @@ class FSIAgent:
 
         return agent_executor
 
+    def set_memory(self, memory):
+        """
+        Swaps in per-session memory without rebuilding the agent and tools.
+        """
+        self.memory = memory
+        self.agent.memory = memory
+
     def run(self, input):
         print("Running FSI Agent with input: " + str(input))
         try:
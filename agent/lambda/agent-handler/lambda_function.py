@@ -1,310 +1,415 @@
-import datetime
-import difflib
-import json
-import logging
-import os
-import time
-
-import boto3
-import dateutil.parser
-import pdfrw
-from boto3.dynamodb.conditions import Key
-from chat import Chat
-from fsi_agent import FSIAgent
-from langchain.chains import ConversationChain
-from langchain.llms.bedrock import Bedrock
-
-# Create reference to DynamoDB tables and S3 bucket
-user_accounts_table_name = os.environ["USER_EXISTING_ACCOUNTS_TABLE"]
-s3_artifact_bucket = os.environ["S3_ARTIFACT_BUCKET_NAME"]
-
-# Instantiate boto3 clients and resources
-boto3_session = boto3.Session(region_name=os.environ["AWS_REGION"])
-dynamodb = boto3.resource("dynamodb", region_name=os.environ["AWS_REGION"])
-s3_client = boto3.client(
-    "s3",
-    region_name=os.environ["AWS_REGION"],
-    config=boto3.session.Config(
-        signature_version="s3v4",
-    ),
-)
-s3_object = boto3.resource("s3")
-bedrock_client = boto3_session.client(service_name="bedrock-runtime")
-
-# --- Lex v2 request/response helpers ---
-
-
-def elicit_slot(session_attributes, active_contexts, intent, slot_to_elicit, message):
-    """
-    Constructs a response to elicit a specific Amazon Lex intent slot value from the user during conversation.
-    """
-    response = {
-        "sessionState": {
-            "activeContexts": [
-                {
-                    "name": "intentContext",
-                    "contextAttributes": active_contexts,
-                    "timeToLive": {"timeToLiveInSeconds": 86400, "turnsToLive": 20},
-                }
-            ],
-            "sessionAttributes": session_attributes,
-            "dialogAction": {"type": "ElicitSlot", "slotToElicit": slot_to_elicit},
-            "intent": intent,
-        },
-        "messages": [
-            {
-                "contentType": "PlainText",
-                "content": message,
-            }
-        ],
-    }
-
-    return response
-
-
-def elicit_intent(intent_request, session_attributes, message):
-    """
-    Constructs a response to elicit the user's intent during conversation.
-    """
-    response = {
-        "sessionState": {
-            "dialogAction": {"type": "ElicitIntent"},
-            "sessionAttributes": session_attributes,
-        },
-        "messages": [
-            {"contentType": "PlainText", "content": message},
-            {
-                "contentType": "ImageResponseCard",
-                "imageResponseCard": {
-                    "buttons": [
-                        {"text": "Emergency Helpline", "value": "Emergency Helpline"},
-                        {
-                            "text": "Ask Alex Buddy",
-                            "value": "What kind of questions can Alex Buddy answer?",
-                        },
-                    ],
-                    "title": "How can I help you?",
-                },
-            },
-        ],
-    }
-
-    return response
-
-
-def delegate(session_attributes, active_contexts, intent, message):
-    """
-    Delegates the conversation back to the system for handling.
-    """
-    response = {
-        "sessionState": {
-            "activeContexts": [
-                {
-                    "name": "intentContext",
-                    "contextAttributes": active_contexts,
-                    "timeToLive": {"timeToLiveInSeconds": 86400, "turnsToLive": 20},
-                }
-            ],
-            "sessionAttributes": session_attributes,
-            "dialogAction": {
-                "type": "Delegate",
-            },
-            "intent": intent,
-        },
-        "messages": [{"contentType": "PlainText", "content": message}],
-    }
-
-    return response
-
-
-def try_ex(value):
-    """
-    Safely access slots dictionary values.
-    """
-    if value is not None:
-        if value["value"]["resolvedValues"]:
-            return value["value"]["interpretedValue"]
-        elif value["value"]["originalValue"]:
-            return value["value"]["originalValue"]
-        else:
-            return None
-    else:
-        return None
-
-
-# --- Intent fulfillment functions ---
-
-
-def verify_identity(intent_request):
-    """
-    Performs dialog management and fulfillment for username verification.
-    """
-    slots = intent_request["sessionState"]["intent"]["slots"]
-    username = try_ex(slots["UserName"])
-
-    session_attributes = intent_request["sessionState"].get("sessionAttributes") or {}
-    intent = intent_request["sessionState"]["intent"]
-    active_contexts = {}
-
-    if username:
-        session_attributes["UserName"] = username
-        return elicit_intent(
-            intent_request,
-            session_attributes,
-            f"Thank you for confirming your username and PIN, {username}. How are you doing? Is everything going well?",
-        )
-    else:
-        return elicit_slot(
-            session_attributes,
-            active_contexts,
-            intent,
-            "UserName",
-            "Please provide your username to proceed.",
-        )
-
-
-def emergency_helpline(intent_request):
-    """
-    Handles mental health emergency helpline requests.
-    """
-    session_attributes = intent_request["sessionState"].get("sessionAttributes", {})
-    intent = intent_request["sessionState"]["intent"]
-
-    # Get the value of the Selection slot
-    slots = intent.get("slots", {})
-    user_selection = try_ex(slots.get("Selection"))
-
-    if not user_selection:
-        # Elicit the Selection slot if it's not provided
-        return {
-            "sessionState": {
-                "dialogAction": {"type": "ElicitSlot", "slotToElicit": "Selection"},
-                "intent": intent,
-                "sessionAttributes": session_attributes,
-            },
-            "messages": [
-                {
-                    "contentType": "PlainText",
-                    "content": (
-                        "What type of support do you need? Please select one option from below:\n"
-                        "1. General Support\n"
-                        "2. Suicide Prevention\n"
-                        "3. Young People\n"
-                        "4. LGBTQ+ Support\n"
-                        "5. Urgent Help"
-                    ),
-                }
-            ],
-        }
-
-    # Process the user's selection
-    if user_selection == "1":
-        message = "**General Mental Health Support**:\n- Samaritans: Call 116 123 (24/7)\n- NHS 111: Call 111 (24/7)"
-    elif user_selection == "2":
-        message = "**Suicide Prevention**:\n- National Suicide Prevention Helpline: Call 0800 689 5652\n- Papyrus HOPELINEUK: Call 0800 068 4141"
-    elif user_selection == "3":
-        message = "**Support for Young People**:\n- Childline: Call 0800 1111 (24/7)\n- Shout Crisis Text Line: Text 'YM' to 85258"
-    elif user_selection == "4":
-        message = "**LGBTQ+ Support**:\n- Switchboard: Call 0300 330 0630 (10am-10pm)\n- Text 'SHOUT' to 85258 (24/7)"
-    elif user_selection == "5":
-        message = "**Urgent Help**:\n- Call 999 for immediate danger\n- Visit A&E for emergency mental health support"
-    else:
-        message = "I didn’t understand that. Please reply with 1, 2, 3, 4, or 5."
-
-    # Return the message with a "Close" action
-    return {
-        "sessionState": {
-            "dialogAction": {"type": "Close"},
-            "intent": {
-                "name": intent["name"],
-                "slots": intent["slots"],
-                "state": "Fulfilled",
-                "confirmationState": intent.get("confirmationState", "None"),
-            },
-            "sessionAttributes": session_attributes,
-        },
-        "messages": [
-            {
-                "contentType": "PlainText",
-                "content": message,
-            }
-        ],
-    }
-
-
-def invoke_agent(prompt, session_id):
-    """
-    Invokes Amazon Bedrock-powered LangChain agent with 'prompt' input.
-    """
-    chat = Chat({"Human": prompt}, session_id)
-    llm = Bedrock(
-        client=bedrock_client,
-        model_id="anthropic.claude-v2:1",
-        region_name=os.environ["AWS_REGION"],
-    )  # anthropic.claude-instant-v1 / anthropic.claude-3-sonnet-20240229-v1:0
-    llm.model_kwargs = {"max_tokens_to_sample": 350}
-    lex_agent = FSIAgent(llm, chat.memory)
-
-    message = lex_agent.run(input=prompt)
-
-    # summarize response and save in memory
-    formatted_prompt = (
-        "\n\nHuman: "
-        + "Summarize the following within 50 words: "
-        + message
-        + " \n\nAssistant:"
-    )
-    conversation = ConversationChain(llm=llm)
-    ai_response_recap = conversation.predict(input=formatted_prompt)
-    chat.set_memory({"Assistant": ai_response_recap}, session_id)
-
-    return message
-
-
-def genai_intent(intent_request):
-    """
-    Performs dialog management and fulfillment for user utterances that do not match defined intents (e.g., FallbackIntent).
-    Sends user utterance to the 'invoke_agent' method call.
-    """
-    session_attributes = intent_request["sessionState"].get("sessionAttributes") or {}
-    session_id = intent_request["sessionId"]
-
-    if intent_request["invocationSource"] == "DialogCodeHook":
-        prompt = intent_request["inputTranscript"]
-        output = invoke_agent(prompt, session_id)
-        print("FSI Agent response: " + str(output))
-
-    return elicit_intent(intent_request, session_attributes, output)
-
-
-# --- Intents ---
-
-
-def dispatch(intent_request):
-    """
-    Routes the incoming request based on intent.
-    """
-    intent_name = intent_request["sessionState"]["intent"]["name"]
-
-    if intent_name == "VerifyIdentity":
-        return verify_identity(intent_request)
-    elif intent_name == "Emergencyhelpline":
-        return emergency_helpline(intent_request)
-    else:
-        return genai_intent(intent_request)
-
-    raise Exception("Intent with name " + intent_name + " not supported")
-
-
-# --- Main handler ---
-
-
-def handler(event, context):
-    """
-    Invoked when the user provides an utterance that maps to a Lex bot intent.
-    The JSON body of the user request is provided in the event slot.
-    """
-    os.environ["TZ"] = "America/New_York"
-    time.tzset()
-
-    return dispatch(event)
+import datetime
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+import botocore.awsrequest
+import botocore.config
+import semantic_cache
+from boto3.dynamodb.conditions import Key
+
+# Set the process timezone once per container rather than per invocation; the
+# Lambda runtime pre-sets TZ, so this must be a plain assignment
+os.environ["TZ"] = "America/New_York"
+time.tzset()
+
+# Resolve required env vars once at import so missing configuration surfaces at
+# cold-start rather than on the first request
+AWS_REGION = os.environ["AWS_REGION"]
+USER_ACCOUNTS_TABLE = os.environ["USER_EXISTING_ACCOUNTS_TABLE"]
+S3_ARTIFACT_BUCKET = os.environ["S3_ARTIFACT_BUCKET_NAME"]
+
+# Shared client configuration: keep connections alive and pooled across calls
+# so warm invocations skip the TCP+TLS handshake
+boto3_config = botocore.config.Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={"mode": "standard", "max_attempts": 3},
+    connect_timeout=1,
+    read_timeout=30,
+)
+
+# Instantiate boto3 clients and resources
+boto3_session = boto3.Session(region_name=AWS_REGION)
+dynamodb = boto3.resource("dynamodb", region_name=AWS_REGION, config=boto3_config)
+s3_client = boto3.client(
+    "s3",
+    region_name=AWS_REGION,
+    config=boto3_config.merge(
+        botocore.config.Config(
+            signature_version="s3v4",
+        )
+    ),
+)
+s3_object = boto3.resource("s3", config=boto3_config)
+bedrock_client = boto3_session.client(
+    service_name="bedrock-runtime", config=boto3_config
+)
+
+# Pre-warm the connection to the Bedrock runtime endpoint at init so the first
+# model call reuses an already-open TLS session instead of paying the handshake
+# on the user-visible path. A bare GET through the client's pooled session is
+# enough to populate the pool; the control-plane list_foundation_models call
+# would warm a different host than invoke_model uses.
+try:
+    bedrock_client._endpoint.http_session.send(
+        botocore.awsrequest.AWSRequest(
+            method="GET", url=bedrock_client.meta.endpoint_url
+        ).prepare()
+    )
+except Exception as e:
+    print(f"Bedrock endpoint pre-warm failed: {e}")
+
+# Background writes (memory persistence, cache write-through) run here so they
+# don't block the user-visible response; the handler drains them before exit so
+# they complete within the billed duration
+background_executor = ThreadPoolExecutor(max_workers=4)
+pending_writes = []
+
+
+def submit_background_write(fn, *args):
+    """
+    Schedules a write on the background executor; the handler awaits it at exit.
+    """
+    pending_writes.append(background_executor.submit(fn, *args))
+
+
+def drain_background_writes(timeout=10):
+    """
+    Waits for outstanding background writes, logging rather than raising failures.
+    """
+    while pending_writes:
+        future = pending_writes.pop()
+        try:
+            future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Background write failed: {e}")
+
+
+# The LangChain stack is imported lazily inside invoke_agent so cold starts for
+# invocations that only hit VerifyIdentity or Emergencyhelpline skip its import
+# cost; the LLM is still built once per container and reused while warm
+llm = None
+lex_agent = None
+
+
+def get_llm():
+    """
+    Builds the Bedrock LLM on first use and reuses it for the container's lifetime.
+    """
+    global llm
+    if llm is None:
+        from langchain.llms.bedrock import Bedrock
+
+        llm = Bedrock(
+            client=bedrock_client,
+            model_id="anthropic.claude-v2:1",
+            region_name=AWS_REGION,
+        )  # anthropic.claude-instant-v1 / anthropic.claude-3-sonnet-20240229-v1:0
+        llm.model_kwargs = {"max_tokens_to_sample": 350}
+
+    return llm
+
+
+# Helpline responses keyed by the Selection slot value
+HELPLINE_MESSAGES = {
+    "1": "**General Mental Health Support**:\n- Samaritans: Call 116 123 (24/7)\n- NHS 111: Call 111 (24/7)",
+    "2": "**Suicide Prevention**:\n- National Suicide Prevention Helpline: Call 0800 689 5652\n- Papyrus HOPELINEUK: Call 0800 068 4141",
+    "3": "**Support for Young People**:\n- Childline: Call 0800 1111 (24/7)\n- Shout Crisis Text Line: Text 'YM' to 85258",
+    "4": "**LGBTQ+ Support**:\n- Switchboard: Call 0300 330 0630 (10am-10pm)\n- Text 'SHOUT' to 85258 (24/7)",
+    "5": "**Urgent Help**:\n- Call 999 for immediate danger\n- Visit A&E for emergency mental health support",
+}
+
+HELPLINE_SELECTION_PROMPT = (
+    "What type of support do you need? Please select one option from below:\n"
+    "1. General Support\n"
+    "2. Suicide Prevention\n"
+    "3. Young People\n"
+    "4. LGBTQ+ Support\n"
+    "5. Urgent Help"
+)
+
+# Static response fragments shared by the Lex response helpers, built once
+# instead of per call
+INTENT_CONTEXT_TTL = {"timeToLiveInSeconds": 86400, "turnsToLive": 20}
+ELICIT_INTENT_CARD = {
+    "contentType": "ImageResponseCard",
+    "imageResponseCard": {
+        "buttons": [
+            {"text": "Emergency Helpline", "value": "Emergency Helpline"},
+            {
+                "text": "Ask Alex Buddy",
+                "value": "What kind of questions can Alex Buddy answer?",
+            },
+        ],
+        "title": "How can I help you?",
+    },
+}
+
+# --- Lex v2 request/response helpers ---
+
+
+def elicit_slot(session_attributes, active_contexts, intent, slot_to_elicit, message):
+    """
+    Constructs a response to elicit a specific Amazon Lex intent slot value from the user during conversation.
+    """
+    response = {
+        "sessionState": {
+            "activeContexts": [
+                {
+                    "name": "intentContext",
+                    "contextAttributes": active_contexts,
+                    "timeToLive": INTENT_CONTEXT_TTL,
+                }
+            ],
+            "sessionAttributes": session_attributes,
+            "dialogAction": {"type": "ElicitSlot", "slotToElicit": slot_to_elicit},
+            "intent": intent,
+        },
+        "messages": [
+            {
+                "contentType": "PlainText",
+                "content": message,
+            }
+        ],
+    }
+
+    return response
+
+
+def elicit_intent(intent_request, session_attributes, message):
+    """
+    Constructs a response to elicit the user's intent during conversation.
+    """
+    response = {
+        "sessionState": {
+            "dialogAction": {"type": "ElicitIntent"},
+            "sessionAttributes": session_attributes,
+        },
+        "messages": [
+            {"contentType": "PlainText", "content": message},
+            ELICIT_INTENT_CARD,
+        ],
+    }
+
+    return response
+
+
+def delegate(session_attributes, active_contexts, intent, message):
+    """
+    Delegates the conversation back to the system for handling.
+    """
+    response = {
+        "sessionState": {
+            "activeContexts": [
+                {
+                    "name": "intentContext",
+                    "contextAttributes": active_contexts,
+                    "timeToLive": INTENT_CONTEXT_TTL,
+                }
+            ],
+            "sessionAttributes": session_attributes,
+            "dialogAction": {
+                "type": "Delegate",
+            },
+            "intent": intent,
+        },
+    }
+
+    # Lex v2 rejects empty message content, so only attach messages when there
+    # is something to say
+    if message:
+        response["messages"] = [{"contentType": "PlainText", "content": message}]
+
+    return response
+
+
+def try_ex(value):
+    """
+    Safely access slots dictionary values.
+    """
+    if not value:
+        return None
+    v = value.get("value") or {}
+    return (
+        v.get("interpretedValue") if v.get("resolvedValues") else v.get("originalValue")
+    )
+
+
+# --- Intent fulfillment functions ---
+
+
+def verify_identity(intent_request):
+    """
+    Performs dialog management and fulfillment for username verification.
+    """
+    session_attributes = intent_request["sessionState"].get("sessionAttributes") or {}
+    intent = intent_request["sessionState"]["intent"]
+    active_contexts = {}
+
+    # Already verified earlier in the session; skip re-deriving the username
+    # from slots and hand the turn straight back
+    if session_attributes.get("UserName"):
+        return delegate(session_attributes, active_contexts, intent, None)
+
+    slots = intent_request["sessionState"]["intent"]["slots"]
+    username = try_ex(slots["UserName"])
+
+    if username:
+        session_attributes["UserName"] = username
+        return elicit_intent(
+            intent_request,
+            session_attributes,
+            f"Thank you for confirming your username and PIN, {username}. How are you doing? Is everything going well?",
+        )
+    else:
+        return elicit_slot(
+            session_attributes,
+            active_contexts,
+            intent,
+            "UserName",
+            "Please provide your username to proceed.",
+        )
+
+
+def emergency_helpline(intent_request):
+    """
+    Handles mental health emergency helpline requests.
+    """
+    session_attributes = intent_request["sessionState"].get("sessionAttributes", {})
+    intent = intent_request["sessionState"]["intent"]
+
+    # Get the value of the Selection slot
+    slots = intent.get("slots", {})
+    user_selection = try_ex(slots.get("Selection"))
+
+    if not user_selection:
+        # Elicit the Selection slot if it's not provided
+        return {
+            "sessionState": {
+                "dialogAction": {"type": "ElicitSlot", "slotToElicit": "Selection"},
+                "intent": intent,
+                "sessionAttributes": session_attributes,
+            },
+            "messages": [
+                {
+                    "contentType": "PlainText",
+                    "content": HELPLINE_SELECTION_PROMPT,
+                }
+            ],
+        }
+
+    # Process the user's selection
+    message = HELPLINE_MESSAGES.get(
+        user_selection, "I didn’t understand that. Please reply with 1, 2, 3, 4, or 5."
+    )
+
+    # Return the message with a "Close" action
+    return {
+        "sessionState": {
+            "dialogAction": {"type": "Close"},
+            "intent": {
+                "name": intent["name"],
+                "slots": intent["slots"],
+                "state": "Fulfilled",
+                "confirmationState": intent.get("confirmationState", "None"),
+            },
+            "sessionAttributes": session_attributes,
+        },
+        "messages": [
+            {
+                "contentType": "PlainText",
+                "content": message,
+            }
+        ],
+    }
+
+
+def invoke_agent(prompt, session_id):
+    """
+    Invokes Amazon Bedrock-powered LangChain agent with 'prompt' input.
+    """
+    from chat import Chat
+    from fsi_agent import FSIAgent
+
+    global lex_agent
+
+    llm = get_llm()
+    chat = Chat({"Human": prompt}, session_id, llm)
+
+    # The agent's LLM and tools are static, so it is built once per container;
+    # only the per-session memory is swapped in on each turn
+    if lex_agent is None:
+        lex_agent = FSIAgent(llm, chat.memory)
+    else:
+        lex_agent.set_memory(chat.memory)
+
+    message = lex_agent.run(input=prompt)
+
+    # save the raw response in memory off the user-visible path; both turn
+    # messages are flushed in one DynamoDB write, and the summary-buffer memory
+    # condenses the history lazily once it exceeds its token budget
+    chat.queue_message({"Assistant": message})
+    submit_background_write(chat.flush_messages)
+
+    return message
+
+
+def genai_intent(intent_request):
+    """
+    Performs dialog management and fulfillment for user utterances that do not match defined intents (e.g., FallbackIntent).
+    Sends user utterance to the 'invoke_agent' method call.
+    """
+    session_attributes = intent_request["sessionState"].get("sessionAttributes") or {}
+    session_id = intent_request["sessionId"]
+
+    if intent_request["invocationSource"] == "DialogCodeHook":
+        prompt = intent_request["inputTranscript"]
+
+        # Serve semantically similar prompts from the cache before any LLM call
+        output, prompt_embedding = semantic_cache.lookup(prompt)
+        if output is None:
+            output = invoke_agent(prompt, session_id)
+            if prompt_embedding is not None:
+                submit_background_write(
+                    semantic_cache.store, prompt, prompt_embedding, output
+                )
+        print("FSI Agent response: " + str(output))
+
+    return elicit_intent(intent_request, session_attributes, output)
+
+
+# --- Intents ---
+
+
+# Intent routing table; unmatched intents fall through to the GenAI agent
+INTENT_HANDLERS = {
+    "VerifyIdentity": verify_identity,
+    "Emergencyhelpline": emergency_helpline,
+}
+
+
+def dispatch(intent_request):
+    """
+    Routes the incoming request based on intent.
+    """
+    intent_name = intent_request["sessionState"]["intent"]["name"]
+
+    return INTENT_HANDLERS.get(intent_name, genai_intent)(intent_request)
+
+
+# --- Main handler ---
+
+
+def handler(event, context):
+    """
+    Invoked when the user provides an utterance that maps to a Lex bot intent.
+    The JSON body of the user request is provided in the event slot.
+    """
+    try:
+        return dispatch(event)
+    finally:
+        drain_background_writes()
@@ -0,0 +1,152 @@
+import os
+import random
+
+import boto3
+import botocore.config
+import numpy as np
+import orjson
+
+boto3_config = botocore.config.Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={"mode": "standard", "max_attempts": 3},
+    connect_timeout=1,
+    read_timeout=30,
+)
+bedrock = boto3.client(
+    "bedrock-runtime", region_name=os.environ["AWS_REGION"], config=boto3_config
+)
+dynamodb = boto3.client(
+    "dynamodb", region_name=os.environ["AWS_REGION"], config=boto3_config
+)
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v2:0"
+
+# Cosine similarity above which a stored response is served instead of invoking
+# the agent. DynamoDB persistence is optional; without a table the cache is
+# container-local only.
+SIMILARITY_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_TABLE = os.environ.get("SEMANTIC_CACHE_TABLE")
+
+# Number of numeric partition prefixes used to shard cache entries across
+# DynamoDB partitions, and the size of the in-memory hot set.
+NUM_SHARDS = 10
+MAX_CACHE_ENTRIES = 256
+
+# Hot set of recent entries: embeddings as rows of a float32 matrix so a lookup
+# is a single np.dot over the whole set.
+_embeddings = np.empty((0, 0), dtype=np.float32)
+_responses = []
+_warmed = False
+
+
+def _embed(text):
+    """
+    Returns the unit-normalized Titan embedding for 'text'.
+    """
+    response = bedrock.invoke_model(
+        body=orjson.dumps({"inputText": text}),
+        modelId=EMBEDDING_MODEL_ID,
+        accept="application/json",
+        contentType="application/json",
+    )
+    embedding = orjson.loads(response["body"].read())["embedding"]
+    vector = np.asarray(embedding, dtype=np.float32)
+
+    return vector / np.linalg.norm(vector)
+
+
+def _remember(embedding, response):
+    """
+    Adds an entry to the in-memory hot set, evicting the oldest when full.
+    """
+    global _embeddings, _responses
+
+    if _embeddings.size == 0:
+        _embeddings = embedding.reshape(1, -1)
+        _responses = [response]
+        return
+
+    _embeddings = np.vstack([_embeddings, embedding])
+    _responses.append(response)
+    if len(_responses) > MAX_CACHE_ENTRIES:
+        _embeddings = _embeddings[1:]
+        _responses = _responses[1:]
+
+
+def _ensure_warm():
+    """
+    Seeds the hot set from the DynamoDB cache table once per container, so cold
+    containers benefit from entries written by earlier ones.
+    """
+    global _warmed
+
+    if _warmed:
+        return
+    _warmed = True
+
+    if not SEMANTIC_CACHE_TABLE:
+        return
+
+    try:
+        scan = dynamodb.scan(TableName=SEMANTIC_CACHE_TABLE, Limit=MAX_CACHE_ENTRIES)
+        for item in scan.get("Items", []):
+            vector = np.asarray(orjson.loads(item["embedding"]["S"]), dtype=np.float32)
+            _remember(vector, item["response"]["S"])
+        print(f"Semantic cache warmed with {len(_responses)} entries")
+    except Exception as e:
+        print(f"Semantic cache warm-up failed: {e}")
+
+
+def lookup(prompt):
+    """
+    Returns (response, embedding) for a sufficiently similar cached prompt, or
+    (None, embedding) on a miss so the caller can write through after invoking
+    the agent. The cache is best-effort: embedding failures return (None, None)
+    so the turn proceeds without it.
+    """
+    _ensure_warm()
+
+    try:
+        embedding = _embed(prompt)
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return None, None
+
+    if _embeddings.size:
+        similarities = np.dot(_embeddings, embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= SIMILARITY_THRESHOLD:
+            print(f"Semantic cache hit (similarity: {similarities[best]:.3f})")
+            return _responses[best], embedding
+
+    return None, embedding
+
+
+def store(prompt, embedding, response):
+    """
+    Writes a (prompt, embedding, response) entry through to the hot set and, if
+    configured, the DynamoDB cache table.
+    """
+    _remember(embedding, response)
+
+    if not SEMANTIC_CACHE_TABLE:
+        return
+
+    shard = random.randrange(NUM_SHARDS)
+    try:
+        dynamodb.put_item(
+            TableName=SEMANTIC_CACHE_TABLE,
+            Item={
+                "id": {"S": f"{shard}#{prompt[:128]}"},
+                "prompt": {"S": prompt},
+                "embedding": {
+                    "S": orjson.dumps(
+                        embedding, option=orjson.OPT_SERIALIZE_NUMPY
+                    ).decode()
+                },
+                "response": {"S": response},
+            },
+        )
+    except Exception as e:
+        print(f"Semantic cache write failed: {e}")
@@ -1,11 +1,45 @@
-import json
 import os
 from urllib.parse import urlparse
 
 import boto3
+import botocore.config
+import orjson
+from botocore.exceptions import ClientError
 from langchain.agents.tools import Tool
 
-bedrock = boto3.client("bedrock-runtime", region_name=os.environ["AWS_REGION"])
+boto3_config = botocore.config.Config(
+    tcp_keepalive=True,
+    max_pool_connections=50,
+    retries={"mode": "standard", "max_attempts": 3},
+    connect_timeout=1,
+    read_timeout=30,
+)
+bedrock = boto3.client(
+    "bedrock-runtime", region_name=os.environ["AWS_REGION"], config=boto3_config
+)
+kendra = boto3.client("kendra", config=boto3_config)
+
+MODEL_ID = "anthropic.claude-3-7-sonnet-20250219-v1:0"
+
+# Bedrock prompt caching is generally available on Claude 3.5 Haiku and Claude
+# 3.7 Sonnet and newer; other Claude models reject cachePoint blocks with a
+# ValidationException, so those use the plain InvokeModel request path. A
+# rejection at runtime (e.g. an account without caching access) also drops the
+# container back to the non-cached path.
+PROMPT_CACHING_MODEL_PREFIXES = (
+    "anthropic.claude-3-5-haiku",
+    "anthropic.claude-3-7-sonnet",
+)
+PROMPT_CACHING_ENABLED = MODEL_ID.startswith(PROMPT_CACHING_MODEL_PREFIXES)
+
+# Static system preamble kept byte-identical turn-to-turn so the Bedrock prompt
+# cache can serve it on every call after the first.
+SYSTEM_PROMPT = (
+    "Imagine you are GOLDCLOUD's Mental Health AI assistant. You respond quickly and friendly to questions from a user, providing both an answer and the sources used to find that answer. You know English only.\n\n"
+    "Format your response for enhanced human readability.\n\n"
+    "At the end of your response, include the relevant sources if information from specific sources was used in your response. Use the following format for each of the sources used: [Source #: Source Title - Source Link].\n\n"
+    "Using the following context, answer the following question to the best of your ability. Do not include information that is not relevant to the question, and only provide information based on the context provided without making assumptions."
+)
 
 
 class Tools:
@@ -45,8 +79,6 @@ class Tools:
         """
         Performs a Kendra search using the Query API.
         """
-        kendra = boto3.client("kendra")
-
         kendra_response = kendra.query(
             IndexId=os.getenv("KENDRA_INDEX_ID"),
             QueryText=question,
@@ -61,29 +93,60 @@ class Tools:
         # passing in the original question, and various Kendra responses as context into the LLM
         return self.invokeLLM(question, parsed_results)
 
-    def invokeLLM(self, question, context):
+    def converseWithCaching(self, user_text):
         """
-        Generates an answer for the user based on the Kendra response.
+        Invokes the model through the streaming Converse API with a cache point
+        after the static system prompt, so only the question/context tokens are
+        re-evaluated on cache-hit turns. Lex v2 cannot render progressive
+        messages, so the stream is assembled here: chunks are processed as they
+        are generated instead of waiting on the full completion body.
         """
-        prompt_data = f"""
-        Human:
-        Imagine you are GOLDCLOUD's Mental Health AI assistant. You respond quickly and friendly to questions from a user, providing both an answer and the sources used to find that answer. You know English only.
-
-        Format your response for enhanced human readability.
-
-        At the end of your response, include the relevant sources if information from specific sources was used in your response. Use the following format for each of the sources used: [Source #: Source Title - Source Link].
+        response = bedrock.converse_stream(
+            modelId=MODEL_ID,
+            system=[
+                {"text": SYSTEM_PROMPT},
+                {"cachePoint": {"type": "default"}},
+            ],
+            messages=[{"role": "user", "content": [{"text": user_text}]}],
+            inferenceConfig={"maxTokens": 4096, "temperature": 0.5},
+        )
 
-        Using the following context, answer the following question to the best of your ability. Do not include information that is not relevant to the question, and only provide information based on the context provided without making assumptions. 
+        chunks = []
+        cache_read_tokens = 0
+        for event in response["stream"]:
+            if "contentBlockDelta" in event:
+                chunks.append(event["contentBlockDelta"]["delta"].get("text", ""))
+            elif "metadata" in event:
+                usage = event["metadata"].get("usage", {})
+                cache_read_tokens = usage.get("cacheReadInputTokens", 0)
 
-        Question: {question}
+        print(f"Bedrock prompt cache read tokens: {cache_read_tokens}")
 
-        Context: {context}
+        return "".join(chunks)
 
-        \n\nAssistant:
+    def invokeLLM(self, question, context):
+        """
+        Generates an answer for the user based on the Kendra response.
         """
+        global PROMPT_CACHING_ENABLED
+
+        user_text = f"Question: {question}\n\nContext: {context}"
+
+        if PROMPT_CACHING_ENABLED:
+            try:
+                return self.converseWithCaching(user_text)
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ValidationException":
+                    raise
+                # The account lacks prompt-caching access for this model;
+                # disable caching for the container and answer the turn through
+                # the non-cached path instead of failing it
+                print(f"Prompt caching rejected, falling back to InvokeModel: {e}")
+                PROMPT_CACHING_ENABLED = False
 
         # Formatting the prompt as a JSON string
-        json_prompt = json.dumps(
+        prompt_data = f"\n\nHuman: {SYSTEM_PROMPT}\n\n{user_text}\n\nAssistant:"
+        json_prompt = orjson.dumps(
             {
                 "anthropic_version": "bedrock-2023-05-31",
                 "max_tokens": 4096,
@@ -97,13 +160,13 @@ class Tools:
         # Invoking Claude3, passing in our prompt
         response = bedrock.invoke_model(
             body=json_prompt,
-            modelId="anthropic.claude-3-sonnet-20240229-v1:0",
+            modelId=MODEL_ID,
             accept="application/json",
             contentType="application/json",
         )
 
         # Getting the response from Claude3 and parsing it to return to the end user
-        response_body = json.loads(response["body"].read())
+        response_body = orjson.loads(response["body"].read())
         answer = response_body["content"][0]["text"]
 
         return answer